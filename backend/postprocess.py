@@ -0,0 +1,40 @@
+"""Pure helpers for normalizing scraped TGStat channel cards
+
+Kept free of the app, database and browser setup in server.py so worker processes
+can import it cheaply.
+"""
+import re
+from typing import List, Dict, Any, Optional
+
+WHITESPACE_PATTERN = re.compile(r'\s+')
+DIGIT_SPACE_PATTERN = re.compile(r'(?<=\d)\s+(?=\d)')
+SUBSCRIBER_COUNT_PATTERN = re.compile(r'(\d+(?:[.,]\d+)*)\s*(?:(млн|тыс|k|m|к|м)(?!\w))?', re.IGNORECASE)
+SUBSCRIBER_MULTIPLIERS = {'k': 1_000, 'к': 1_000, 'тыс': 1_000, 'm': 1_000_000, 'м': 1_000_000, 'млн': 1_000_000}
+
+def parse_subscriber_count(text: str) -> Optional[int]:
+    """Convert counts like '12.3K', '1,2 млн' or '1 234 567' to an integer"""
+    match = SUBSCRIBER_COUNT_PATTERN.search(DIGIT_SPACE_PATTERN.sub('', text))
+    if not match:
+        return None
+    number, suffix = match.groups()
+    if suffix is None:
+        # Without a suffix, dots and commas are thousands separators
+        return int(re.sub(r'[.,]', '', number))
+    try:
+        # Round rather than truncate: 2.01 * 1_000_000 is 2009999.999... in binary floats
+        return round(float(number.replace(',', '.')) * SUBSCRIBER_MULTIPLIERS[suffix.lower()])
+    except ValueError:
+        return None
+
+def postprocess_channels(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Normalize whitespace in extracted cards and parse their subscriber counts"""
+    return [
+        {
+            'name': WHITESPACE_PATTERN.sub(' ', item['name']).strip(),
+            'link': item['link'].strip(),
+            'subscribers': WHITESPACE_PATTERN.sub(' ', item['subscribers']).strip(),
+            'description': WHITESPACE_PATTERN.sub(' ', item['description']).strip(),
+            'subscribers_count': parse_subscriber_count(item['subscribers']),
+        }
+        for item in items
+    ]
@@ -1,21 +1,33 @@
-from fastapi import FastAPI, APIRouter, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, APIRouter, HTTPException, BackgroundTasks, Query
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import WriteConcern
 import os
 import logging
 from pathlib import Path
+from urllib.parse import quote
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import uuid
 from datetime import datetime
 import asyncio
 import json
-from playwright.async_api import async_playwright, Browser, Page
+import orjson
+import re
+from playwright.async_api import async_playwright, Browser, BrowserContext, Page
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 import time
+import functools
+import itertools
 import random
 from enum import Enum
+from dataclasses import dataclass, asdict
+from postprocess import parse_subscriber_count, postprocess_channels
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -25,14 +37,118 @@ mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
-# Create the main app without a prefix
-app = FastAPI()
+# Channel documents are written in unordered batches of this size
+INSERT_BATCH_SIZE = 1000
+# FAST_INSERT=1 switches large result sets to unacknowledged (w=0) writes
+FAST_INSERT = os.environ.get('FAST_INSERT') == '1'
+FAST_INSERT_MIN_RESULTS = 100
+
+# Create the main app without a prefix; orjson serializes the large result payloads
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
+# Upper bound on browser contexts shared by all parsing tasks
+BROWSER_MAX_CONTEXTS = int(os.environ.get('BROWSER_MAX_CONTEXTS', '8'))
+USER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+# Cookies/local storage of a session that passed Cloudflare, loaded into new contexts
+CF_STATE_PATH = Path(os.environ.get('CF_STATE_PATH', str(ROOT_DIR / 'cf_state.json')))
+
+# TG_DEBUG=1 saves a screenshot and logs an HTML sample for every parsed page
+TG_DEBUG = os.environ.get('TG_DEBUG') == '1'
+
+# Parsed pages are reused for this many seconds before TGStat is hit again
+PAGE_CACHE_TTL = int(os.environ.get('PAGE_CACHE_TTL', '600'))
+
+# Largest page of results returned by /parsing-results (covers a full 50-page run)
+MAX_RESULTS_PAGE = 1000
+
+# Parsing task state expires from the store after this many seconds
+TASK_TTL_SECONDS = int(os.environ.get('TASK_TTL_SECONDS', '86400'))
+
+# How often /parsing-stream re-reads the task (and sends a keepalive) while it is still running
+STATUS_STREAM_INTERVAL = 1.0
+
+# Requests aborted before they hit the network; parsing only needs the HTML and scripts
+BLOCKED_RESOURCE_TYPES = frozenset({'image', 'media', 'font', 'stylesheet'})
+BLOCKED_URL_PATTERN = re.compile(r'google-analytics|googletagmanager|gtag|doubleclick|facebook\.net|mc\.yandex')
+
+async def block_heavy_resources(route):
+    """Playwright route handler dropping media, styles and trackers"""
+    request = route.request
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or BLOCKED_URL_PATTERN.search(request.url):
+        await route.abort()
+    else:
+        await route.continue_()
+
+# Post-processing of extracted cards, run in worker processes to keep the event loop free.
+# Workers come from a forkserver so they neither inherit Motor's threads and the Playwright
+# pipes nor re-run this module's app and database setup.
+POSTPROCESS_WORKERS = int(os.environ.get('POSTPROCESS_WORKERS', str(os.cpu_count() or 1)))
+POSTPROCESS_EXECUTOR = ProcessPoolExecutor(
+    max_workers=POSTPROCESS_WORKERS,
+    mp_context=multiprocessing.get_context("forkserver")
+)
+
+# In-page extraction of channel cards; returns plain JSON so parse_page needs a single evaluate().
+# Takes TGStatParser.EXTRACT_SELECTORS as its argument.
+EXTRACT_CHANNELS_JS = """
+(sels) => {
+    // One query per field: the comma-joined selector group matches all candidates at once
+    const firstText = (el, group, accept) => {
+        for (const node of el.querySelectorAll(group)) {
+            const text = (node.textContent || '').trim();
+            if (text && accept(text)) return text;
+        }
+        return null;
+    };
+    const firstLink = (el) => {
+        for (const node of el.querySelectorAll(sels.link)) {
+            const href = node.getAttribute('href');
+            if (href && href.includes('t.me')) return href;
+        }
+        return null;
+    };
+
+    // Pick the first card selector that yields substantial results
+    let selector = null;
+    let cards = [];
+    for (const sel of sels.cards) {
+        const found = document.querySelectorAll(sel);
+        if (found.length > 3) {
+            selector = sel;
+            cards = Array.from(found);
+            break;
+        }
+    }
+
+    const items = [];
+    for (const el of cards.slice(0, 10)) {  // Limit to 10 items per page
+        const name = firstText(el, sels.name, () => true) ?? 'N/A';
+        const link = firstLink(el) ?? 'N/A';
+        // Only keep items with meaningful data
+        if (name === 'N/A' && link === 'N/A') continue;
+        items.push({
+            name,
+            link,
+            subscribers: firstText(el, sels.subscribers, (t) => /\\d/.test(t)) ?? 'N/A',
+            description: (firstText(el, sels.description, () => true) ?? '').slice(0, 200),
+        });
+    }
+    // Highest numbered pagination link, so page 1 also tells how many pages exist
+    const pageNumbers = Array.from(document.querySelectorAll(sels.pagination))
+        .map((node) => (node.textContent || '').trim())
+        .filter((text) => /^\\d+$/.test(text))
+        .map(Number);
+    const last_page = pageNumbers.length ? Math.max(...pageNumbers) : null;
+
+    return {selector, count: cards.length, items, last_page};
+}
+"""
+
 # Global variables for parsing
-parsing_tasks = {}
 browser: Browser = None
 parsing_results = {}
 
@@ -61,38 +177,111 @@ class ParsingRequest(BaseModel):
     content_types: List[ContentType]
     max_pages: int = 3
 
+@dataclass(slots=True, frozen=True)
+class ChannelResult:
+    name: str
+    link: str
+    subscribers: str
+    description: str = ""
+    category: str = ""
+    content_type: str = ""
+    subscribers_count: Optional[int] = None
+
 class ParsingTask(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     category: str
     content_types: List[ContentType]
     max_pages: int
+    use_cache: bool = True
     status: ParsingStatus = ParsingStatus.pending
     progress: int = 0
     total_pages: int = 0
-    results: List[Dict[str, Any]] = []
+    # Stored as plain dicts; ChannelResult is only used for in-process records
+    last_page_sample: List[Dict[str, Any]] = []
     error_message: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     completed_at: Optional[datetime] = None
 
-class ChannelResult(BaseModel):
-    name: str
-    link: str
-    subscribers: str
-    description: Optional[str] = None
-    category: Optional[str] = None
 
-# TGStat Parser Class
-class TGStatParser:
-    def __init__(self):
+# Task state store shared by all workers
+class TaskStore:
+    def __init__(self, collection, ttl_seconds: int = TASK_TTL_SECONDS):
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+        
+    async def init(self):
+        """Create lookup and expiry indexes"""
+        await self.collection.create_index("id", unique=True)
+        await self.collection.create_index("created_at", expireAfterSeconds=self.ttl_seconds)
+        
+    async def create(self, task: ParsingTask):
+        """Persist a newly created task"""
+        await self.collection.insert_one(task.dict())
+        
+    async def get(self, task_id: str, validate: bool = True) -> Optional[ParsingTask]:
+        """Load a task, or None if it is unknown or expired
+
+        Read-only callers pass validate=False to skip re-validating the stored document.
+        Results are not part of the task; they live in parsing_channels.
+        """
+        doc = await self.collection.find_one({"id": task_id}, {"_id": 0})
+        if not doc:
+            return None
+        return ParsingTask(**doc) if validate else ParsingTask.model_construct(**doc)
+        
+    async def update(self, task_id: str, **fields):
+        """Set the given task fields"""
+        await self.collection.update_one({"id": task_id}, {"$set": fields})
+
+task_store = TaskStore(db.parsing_tasks)
+
+# Parsed TGStat pages keyed by URL, shared by all parsing tasks
+class PageCache:
+    def __init__(self, ttl_seconds: int, max_entries: int = 512):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: Dict[str, Tuple[float, Any]] = {}
+        
+    def get(self, key: str) -> Any:
+        """Return the cached value, or None if missing or expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        return value
+        
+    def set(self, key: str, value: Any):
+        """Store a value for ttl_seconds, evicting the oldest entry when full"""
+        self._entries.pop(key, None)
+        if len(self._entries) >= self.max_entries:
+            del self._entries[next(iter(self._entries))]
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+
+page_cache = PageCache(ttl_seconds=PAGE_CACHE_TTL)
+
+# Shared browser pool
+class BrowserPool:
+    def __init__(self, max_contexts: int = 8):
         self.playwright = None
-        self.browser = None
-        self.page = None
+        self.max_contexts = max(1, max_contexts)
+        self.mock_mode = False
+        self._browser: Optional[Browser] = None
+        self._contexts: List[BrowserContext] = []
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._ready_at: Dict[BrowserContext, float] = {}
+        self._lock = asyncio.Lock()
+        self._state_saved = False
         self.logger = logging.getLogger(__name__)
         
-    async def init(self):
-        """Initialize Playwright browser with Cloudflare bypass settings"""
+    async def _launch(self):
+        """Launch Playwright browser with Cloudflare bypass settings"""
         try:
-            self.playwright = await async_playwright().start()
+            # The driver survives a browser crash; only start it on the first launch
+            if self.playwright is None:
+                self.playwright = await async_playwright().start()
             
             # Try different browser configurations
             launch_options = {
@@ -106,260 +295,320 @@ class TGStatParser:
                     '--disable-features=VizDisplayCompositor',
                     '--disable-extensions',
                     '--disable-plugins',
-                    '--disable-images',
-                    '--user-agent=Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+                    f'--user-agent={USER_AGENT}'
                 ]
             }
             
             try:
-                self.browser = await self.playwright.chromium.launch(**launch_options)
+                self._browser = await self.playwright.chromium.launch(**launch_options)
             except Exception as chrome_error:
                 self.logger.warning(f"⚠️ Failed to launch Chromium: {chrome_error}. Trying headless shell...")
                 # Try chromium headless shell
                 launch_options['channel'] = 'chrome'  # Try different channel
                 try:
-                    self.browser = await self.playwright.chromium.launch(**launch_options)
+                    self._browser = await self.playwright.chromium.launch(**launch_options)
                 except Exception as shell_error:
                     self.logger.error(f"❌ All browser launch attempts failed: {shell_error}")
-                    # Return True for mock mode
-                    self.browser = None
-                    self.page = None
+                    self.mock_mode = True
                     self.logger.warning("⚠️ Running in MOCK MODE - will use sample data")
-                    return True
+                    return
             
-            if self.browser:
-                self.page = await self.browser.new_page()
-                
-                # Additional stealth settings
-                await self.page.add_init_script("""
-                    Object.defineProperty(navigator, 'webdriver', {
-                        get: () => undefined,
-                    });
-                """)
-                
-                self.logger.info("🚀 TGStat Parser initialized successfully with real browser")
-            else:
-                self.logger.info("🚀 TGStat Parser initialized in MOCK MODE")
-                
-            return True
+            self._browser.on("disconnected", self._on_disconnected)
+            self.logger.info("🚀 Browser pool started with real browser")
             
         except Exception as e:
-            self.logger.error(f"❌ Failed to initialize parser: {str(e)}")
-            # Return True for mock mode fallback
-            self.browser = None
-            self.page = None
+            self.logger.error(f"❌ Failed to start browser pool: {str(e)}")
+            self._browser = None
+            self.mock_mode = True
             self.logger.warning("⚠️ Fallback to MOCK MODE - will use sample data")
-            return True
+            
+    def _on_disconnected(self, browser: Browser):
+        """Forget a crashed or closed browser and its contexts so the next lease relaunches"""
+        if browser is not self._browser:
+            return
+        self.logger.warning("⚠️ Browser disconnected, it will be relaunched on next use")
+        self._browser = None
+        self._contexts = []
+        self._idle = asyncio.Queue()
+        self._ready_at = {}
+        self._state_saved = False
+        
+    async def _ensure_browser(self) -> Optional[Browser]:
+        """Lazily launch the shared browser on first use, and again after it disconnected"""
+        if self._browser is not None and not self._browser.is_connected():
+            self._on_disconnected(self._browser)
+        if self._browser is None and not self.mock_mode:
+            async with self._lock:
+                if self._browser is None and not self.mock_mode:
+                    await self._launch()
+        return self._browser
+        
+    async def _new_context(self) -> BrowserContext:
+        """Create a browser context with a single page"""
+        # Reuse cookies from an earlier run that already passed the Cloudflare check
+        storage_state = str(CF_STATE_PATH) if CF_STATE_PATH.exists() else None
+        try:
+            context = await self._browser.new_context(
+                user_agent=USER_AGENT,
+                java_script_enabled=True,
+                storage_state=storage_state
+            )
+        except Exception as e:
+            if storage_state is None:
+                raise
+            # An unreadable state file must not block every checkout; start without it
+            self.logger.warning(f"⚠️ Ignoring unusable session state {CF_STATE_PATH}: {str(e)}")
+            context = await self._browser.new_context(
+                user_agent=USER_AGENT,
+                java_script_enabled=True
+            )
+        
+        # Additional stealth settings
+        await context.add_init_script("""
+            Object.defineProperty(navigator, 'webdriver', {
+                get: () => undefined,
+            });
+        """)
+        
+        # Skip images, fonts, styles and analytics for every page in this context
+        await context.route("**/*", block_heavy_resources)
+        
+        await context.new_page()
+        return context
+        
+    async def _checkout(self) -> BrowserContext:
+        """Take an idle context, creating one while below max_contexts"""
+        if self._idle.empty():
+            async with self._lock:
+                if len(self._contexts) < self.max_contexts:
+                    context = await self._new_context()
+                    self._contexts.append(context)
+                    self.logger.info(f"🧩 Opened browser context {len(self._contexts)}/{self.max_contexts}")
+                    return context
+        return await self._idle.get()
+        
+    async def save_storage_state(self, context: BrowserContext):
+        """Persist the cookies of a context that got past Cloudflare, once per browser launch"""
+        if self._state_saved:
+            return
+        self._state_saved = True
+        # Write to a private temp file and swap it in, so readers never see a partial file
+        tmp_path = CF_STATE_PATH.with_name(f"{CF_STATE_PATH.name}.{os.getpid()}.{uuid.uuid4().hex}.tmp")
+        try:
+            await context.storage_state(path=str(tmp_path))
+            os.replace(tmp_path, CF_STATE_PATH)
+            self.logger.info(f"🍪 Saved Cloudflare session state to {CF_STATE_PATH}")
+        except Exception as e:
+            self._state_saved = False
+            tmp_path.unlink(missing_ok=True)
+            self.logger.warning(f"⚠️ Failed to save session state: {str(e)}")
+            
+    @asynccontextmanager
+    async def acquire(self):
+        """Lend a browser context (None in mock mode) and take it back afterwards
+
+        Each context waits a random 3-8 s between navigations to avoid rate limiting.
+        The delay is paid before the next use, so the last page of a run never waits.
+        """
+        if await self._ensure_browser() is None:
+            yield None
+            return
+        context = await self._checkout()
+        delay = self._ready_at.get(context, 0) - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        try:
+            yield context
+        finally:
+            # Contexts of a browser that disconnected meanwhile are not handed out again
+            if context in self._contexts:
+                self._ready_at[context] = time.monotonic() + random.uniform(3, 8)
+                self._idle.put_nowait(context)
             
     async def close(self):
         """Close browser and playwright"""
         try:
-            if self.page:
-                await self.page.close()
-            if self.browser:
-                await self.browser.close()
+            for context in self._contexts:
+                await context.close()
+            self._contexts = []
+            self._idle = asyncio.Queue()
+            self._ready_at = {}
+            if self._browser:
+                await self._browser.close()
+                self._browser = None
             if self.playwright:
                 await self.playwright.stop()
-            self.logger.info("🔒 Parser closed successfully")
+                self.playwright = None
+            self.mock_mode = False
+            self._state_saved = False
+            self.logger.info("🔒 Browser pool closed successfully")
         except Exception as e:
-            self.logger.error(f"❌ Error closing parser: {str(e)}")
-            
-    async def get_total_pages(self, category: str, content_type: str, max_pages: int) -> int:
-        """Get total number of pages available for parsing"""
-        try:
-            # If no browser (mock mode), return max_pages
-            if not self.browser or not self.page:
-                self.logger.info(f"📊 Mock mode: returning max_pages {max_pages}")
-                return max_pages
-                
-            # Build URL based on content type
-            if content_type == "channels":
-                url = f"https://tgstat.ru/channels"
+            self.logger.error(f"❌ Error closing browser pool: {str(e)}")
+
+# Sample channel names based on category
+MOCK_CHANNEL_NAMES = {
+    'crypto': ['CryptoNews', 'BitcoinAnalytics', 'DeFi Hub', 'Altcoin Signals', 'Blockchain Today', 'Crypto Insider', 'Digital Assets', 'Web3 News'],
+    'tech': ['TechCrunch', 'TechNews', 'AI Updates', 'DevNews', 'StartupLife', 'Programming', 'Silicon Valley', 'TechTrends'],
+    'news': ['Breaking News', 'World Today', 'Daily Updates', 'News Flash', 'Current Events', 'Headlines', 'News Digest', 'Live News'],
+    'business': ['Business Insider', 'Finance Today', 'Market News', 'Startup Hub', 'Investment Tips', 'Business World', 'Economy Updates', 'Trading Signals'],
+    'entertainment': ['Entertainment Hub', 'Movie News', 'Celebrity Updates', 'Music World', 'Pop Culture', 'Show Biz', 'Hollywood News', 'Entertainment Weekly']
+}
+MOCK_DEFAULT_NAMES = ['Sample Channel 1', 'Sample Channel 2', 'Sample Channel 3', 'Sample Channel 4', 'Sample Channel 5', 'Sample Channel 6', 'Sample Channel 7', 'Sample Channel 8']
+MOCK_BASE_SUBSCRIBERS = [50000, 75000, 100000, 150000, 200000, 300000, 500000, 1000000]
+
+@functools.lru_cache(maxsize=512)
+def build_mock_channels(category: str, page: int, content_type: str) -> Tuple[ChannelResult, ...]:
+    """Build the 8 mock channels of a page once; repeat fallbacks reuse the tuple"""
+    names_list = MOCK_CHANNEL_NAMES.get(category, MOCK_DEFAULT_NAMES)
+    description_prefix = f'Quality {category} content and updates. Page {page}, item '
+    
+    mock_channels = []
+    for i in range(8):  # 8 channels per page
+        name = names_list[((page - 1) * 8 + i) % len(names_list)]
+        suffix = f"{page}-{i+1}"
+        subscriber_base = MOCK_BASE_SUBSCRIBERS[i] + (page - 1) * 10000 + random.randint(-5000, 15000)
+        
+        # Format subscriber count realistically
+        if subscriber_base >= 1000000:
+            formatted_subs = f"{subscriber_base // 1000000:.1f}M"
+        elif subscriber_base >= 1000:
+            formatted_subs = f"{subscriber_base // 1000:.1f}K"
+        else:
+            formatted_subs = str(subscriber_base)
+        
+        mock_channels.append(ChannelResult(
+            name=name + " " + suffix,
+            link='https://t.me/' + name.lower().replace(" ", "_") + "_" + suffix.replace("-", "_"),
+            subscribers=formatted_subs,
+            description=description_prefix + str(i + 1),
+            category=category,
+            content_type=content_type,
+            subscribers_count=parse_subscriber_count(formatted_subs)
+        ))
+    return tuple(mock_channels)
+
+# TGStat Parser Class
+class TGStatParser:
+    # Card selectors are tried in order; field selectors are comma-joined CSS groups
+    CARD_SELECTORS = ['.channel-card', '.channel-item', '.card', '.list-item', '[data-channel]', '.row .col-md-6', 'article', '.media']
+    NAME_SEL = '.title, .name, .channel-name, h2, h3, .card-title, strong'
+    LINK_SEL = 'a[href*="t.me"], a[href*="telegram"], .link, .url'
+    SUB_SEL = '.subscribers, .members, .count, .stats, .number'
+    DESC_SEL = '.description, .desc, .text, .summary'
+    PAGINATION_SEL = '.pagination a, .page-numbers a'
+    PAGE_READY_SEL = ', '.join(CARD_SELECTORS + ['.pagination'])
+    EXTRACT_SELECTORS = {
+        'cards': CARD_SELECTORS,
+        'name': NAME_SEL,
+        'link': LINK_SEL,
+        'subscribers': SUB_SEL,
+        'description': DESC_SEL,
+        'pagination': PAGINATION_SEL,
+    }
+    
+    def __init__(self, pool: BrowserPool, use_cache: bool = True):
+        self.pool = pool
+        self.use_cache = use_cache
+        self._results_count = 0
+        self._progress_lock = asyncio.Lock()
+        self.logger = logging.getLogger(__name__)
+        
+    @asynccontextmanager
+    async def _lease_page(self):
+        """Borrow a page from the browser pool (yields None in mock mode)"""
+        async with self.pool.acquire() as context:
+            if context is None:
+                yield None
             else:
-                url = f"https://tgstat.ru/chats"
-            
-            self.logger.info(f"🔍 Getting total pages from: {url}")
-            
-            # Navigate to the page
-            await self.page.goto(url, wait_until="domcontentloaded", timeout=60000)
-            
-            # Wait for Cloudflare check
-            await asyncio.sleep(random.uniform(8, 15))
+                yield context.pages[0] if context.pages else await context.new_page()
             
-            # Try to find pagination or assume max_pages
-            try:
-                # Look for pagination elements (this is a mock implementation)
-                # In real implementation, you would find the actual pagination
-                pagination_elements = await self.page.query_selector_all('.pagination a, .page-numbers a')
-                if pagination_elements:
-                    # Extract page numbers and find the maximum
-                    pages = []
-                    for elem in pagination_elements:
-                        text = await elem.text_content()
-                        if text and text.isdigit():
-                            pages.append(int(text))
-                    total = max(pages) if pages else max_pages
-                else:
-                    total = max_pages
-            except:
-                total = max_pages
-                
-            # Limit to max_pages requested
-            total = min(total, max_pages)
-            self.logger.info(f"📊 Total pages to parse: {total}")
-            return total
+    def _page_url(self, content_type: str, page: int = 1) -> str:
+        """Build TGStat listing URL for a content type and page"""
+        if content_type == "channels":
+            url = "https://tgstat.ru/channels"
+        else:
+            url = "https://tgstat.ru/chats"
+        
+        # Add pagination parameter if page > 1
+        if page > 1:
+            url += f"?page={page}"
+        return url
+        
+    async def _wait_until_ready(self, tab: Page, selector: str, timeout: int,
+                                fallback_delay: Optional[Tuple[float, float]] = None) -> bool:
+        """Wait for selector instead of a blind sleep; sleep fallback_delay only on timeout"""
+        try:
+            await tab.wait_for_selector(selector, timeout=timeout)
+            return True
+        except PlaywrightTimeoutError:
+            self.logger.warning(f"⚠️ '{selector}' not found within {timeout}ms (Cloudflare challenge?)")
+            if fallback_delay:
+                await asyncio.sleep(random.uniform(*fallback_delay))
+            return False
             
-        except Exception as e:
-            self.logger.error(f"❌ Error getting total pages: {str(e)}")
-            return max_pages
+    async def parse_page(self, category: str, content_type: str, page: int = 1) -> Tuple[List[ChannelResult], Optional[int]]:
+        """Parse a single page of TGStat for channels/chats, serving repeats from the page cache
+
+        Returns the channels and the last page number found in the pagination (None if absent).
+        """
+        url = self._page_url(content_type, page)
+        extracted = page_cache.get(url) if self.use_cache else None
+        if extracted is not None:
+            self.logger.info(f"⚡ Cache hit for page {page}: {url}")
+            return self._build_channels(extracted, category, content_type, page), extracted['last_page']
             
-    async def parse_page(self, category: str, content_type: str, page: int = 1) -> List[Dict[str, Any]]:
-        """Parse a single page of TGStat for channels/chats"""
+        # The pool paces each context between navigations; other contexts keep working
+        async with self._lease_page() as tab:
+            return await self._scrape_page(tab, url, category, content_type, page)
+        
+    async def _scrape_page(self, tab: Optional[Page], url: str, category: str, content_type: str, page: int) -> Tuple[List[ChannelResult], Optional[int]]:
+        """Navigate a leased browser page to url and extract its channels"""
         try:
             # If no browser (mock mode), return mock data
-            if not self.browser or not self.page:
+            if tab is None:
                 self.logger.info(f"🔍 Mock mode: generating data for page {page}")
-                return self._generate_mock_data(category, page, content_type)
-                
-            # Build URL for specific page
-            if content_type == "channels":
-                url = f"https://tgstat.ru/channels"
-            else:
-                url = f"https://tgstat.ru/chats"
-            
-            # Add pagination parameter if page > 1
-            if page > 1:
-                url += f"?page={page}"
+                return self._generate_mock_data(category, page, content_type), None
                 
             self.logger.info(f"🔍 Parsing page {page}: {url}")
             
             # Navigate to the page
-            await self.page.goto(url, wait_until="domcontentloaded", timeout=60000)
-            
-            # Wait for Cloudflare and page load
-            await asyncio.sleep(random.uniform(5, 10))
+            await tab.goto(url, wait_until="domcontentloaded", timeout=60000)
             
-            # Take screenshot for debugging
-            await self.page.screenshot(path=f"/tmp/tgstat_page_{page}.png")
+            # Wait for Cloudflare and page load; back off only if content never showed up
+            if await self._wait_until_ready(tab, self.PAGE_READY_SEL, timeout=15000, fallback_delay=(5, 10)):
+                # Real content means Cloudflare let us through; later contexts start trusted
+                await self.pool.save_storage_state(tab.context)
             
-            # Check page content
-            page_content = await self.page.content()
-            self.logger.info(f"📄 Page content sample: {page_content[:500]}")
+            if TG_DEBUG:
+                # Take screenshot for debugging
+                await tab.screenshot(path=f"/tmp/tgstat_{content_type}_page_{page}.png")
+                
+                # Check page content
+                page_content = await tab.content()
+                self.logger.info(f"📄 Page content sample: {page_content[:500]}")
             
             channels = []
+            detected_total = None
             
             try:
                 # Real TGStat parsing selectors (these may need adjustment based on actual site structure)
                 # Wait for content to load
-                await self.page.wait_for_selector('body', timeout=30000)
-                
-                # Try multiple possible selectors for channel cards
-                possible_selectors = [
-                    '.channel-card',
-                    '.channel-item', 
-                    '.card',
-                    '.list-item',
-                    '[data-channel]',
-                    '.row .col-md-6',  # Common grid layout
-                    'article',
-                    '.media'
-                ]
+                await tab.wait_for_selector('body', timeout=30000)
                 
-                channel_items = []
-                for selector in possible_selectors:
-                    try:
-                        items = await self.page.query_selector_all(selector)
-                        if items and len(items) > 3:  # If we found substantial results
-                            channel_items = items
-                            self.logger.info(f"✅ Found {len(items)} items with selector: {selector}")
-                            break
-                    except:
-                        continue
+                # Extract every channel card in one round-trip instead of per-element CDP calls
+                extracted = await tab.evaluate(EXTRACT_CHANNELS_JS, self.EXTRACT_SELECTORS)
                 
                 # If no real content found, use mock data for development
-                if not channel_items:
+                if not extracted['selector']:
                     self.logger.warning("⚠️ No channel items found, using mock data")
-                    return self._generate_mock_data(category, page, content_type)
+                    return self._generate_mock_data(category, page, content_type), None
                 
-                # Parse each channel item
-                for i, item in enumerate(channel_items[:10]):  # Limit to 10 items per page
-                    try:
-                        # Extract channel name
-                        name_selectors = ['.title', '.name', '.channel-name', 'h2', 'h3', '.card-title', 'strong']
-                        name = "N/A"
-                        for name_sel in name_selectors:
-                            try:
-                                name_elem = await item.query_selector(name_sel)
-                                if name_elem:
-                                    name_text = await name_elem.text_content()
-                                    if name_text and name_text.strip():
-                                        name = name_text.strip()
-                                        break
-                            except:
-                                continue
-                                
-                        # Extract channel link
-                        link_selectors = ['a[href*="t.me"]', 'a[href*="telegram"]', '.link', '.url']
-                        link = "N/A"
-                        for link_sel in link_selectors:
-                            try:
-                                link_elem = await item.query_selector(link_sel)
-                                if link_elem:
-                                    link_href = await link_elem.get_attribute('href')
-                                    if link_href and 't.me' in link_href:
-                                        link = link_href
-                                        break
-                            except:
-                                continue
-                                
-                        # Extract subscriber count
-                        sub_selectors = ['.subscribers', '.members', '.count', '.stats', '.number']
-                        subscribers = "N/A"
-                        for sub_sel in sub_selectors:
-                            try:
-                                sub_elem = await item.query_selector(sub_sel)
-                                if sub_elem:
-                                    sub_text = await sub_elem.text_content()
-                                    if sub_text and any(char.isdigit() for char in sub_text):
-                                        subscribers = sub_text.strip()
-                                        break
-                            except:
-                                continue
-                        
-                        # Extract description (optional)
-                        desc_selectors = ['.description', '.desc', '.text', '.summary']
-                        description = ""
-                        for desc_sel in desc_selectors:
-                            try:
-                                desc_elem = await item.query_selector(desc_sel)
-                                if desc_elem:
-                                    desc_text = await desc_elem.text_content()
-                                    if desc_text and desc_text.strip():
-                                        description = desc_text.strip()[:200]  # Limit description
-                                        break
-                            except:
-                                continue
-                        
-                        # Only add if we have meaningful data
-                        if name != "N/A" or link != "N/A":
-                            channels.append({
-                                'name': name,
-                                'link': link,
-                                'subscribers': subscribers,
-                                'description': description,
-                                'category': category,
-                                'content_type': content_type
-                            })
-                            
-                    except Exception as e:
-                        self.logger.error(f"❌ Error parsing channel item {i}: {str(e)}")
-                        continue
-                
-                # If we didn't get enough real data, supplement with mock data
-                if len(channels) < 3:
-                    self.logger.warning(f"⚠️ Only found {len(channels)} real channels, supplementing with mock data")
-                    mock_channels = self._generate_mock_data(category, page, content_type)
-                    channels.extend(mock_channels[:max(0, 8 - len(channels))])
+                self.logger.info(f"✅ Found {extracted['count']} items with selector: {extracted['selector']}")
+                loop = asyncio.get_running_loop()
+                extracted['items'] = await loop.run_in_executor(POSTPROCESS_EXECUTOR, postprocess_channels, extracted['items'])
+                page_cache.set(url, extracted)
+                channels = self._build_channels(extracted, category, content_type, page)
+                detected_total = extracted['last_page']
                 
             except Exception as e:
                 self.logger.error(f"❌ Error in parsing logic: {str(e)}")
@@ -367,123 +616,141 @@ class TGStatParser:
                 channels = self._generate_mock_data(category, page, content_type)
             
             self.logger.info(f"✅ Successfully parsed {len(channels)} channels from page {page}")
-            return channels
+            return channels, detected_total
             
         except Exception as e:
             self.logger.error(f"❌ Error parsing page {page}: {str(e)}")
             # Return mock data as fallback
-            return self._generate_mock_data(category, page, content_type)
+            return self._generate_mock_data(category, page, content_type), None
             
-    def _generate_mock_data(self, category: str, page: int, content_type: str) -> List[Dict[str, Any]]:
-        """Generate realistic mock data for development/testing"""
-        mock_channels = []
-        
-        # Sample channel names based on category
-        channel_names = {
-            'crypto': ['CryptoNews', 'BitcoinAnalytics', 'DeFi Hub', 'Altcoin Signals', 'Blockchain Today', 'Crypto Insider', 'Digital Assets', 'Web3 News'],
-            'tech': ['TechCrunch', 'TechNews', 'AI Updates', 'DevNews', 'StartupLife', 'Programming', 'Silicon Valley', 'TechTrends'],
-            'news': ['Breaking News', 'World Today', 'Daily Updates', 'News Flash', 'Current Events', 'Headlines', 'News Digest', 'Live News'],
-            'business': ['Business Insider', 'Finance Today', 'Market News', 'Startup Hub', 'Investment Tips', 'Business World', 'Economy Updates', 'Trading Signals'],
-            'entertainment': ['Entertainment Hub', 'Movie News', 'Celebrity Updates', 'Music World', 'Pop Culture', 'Show Biz', 'Hollywood News', 'Entertainment Weekly']
-        }
-        
-        names_list = channel_names.get(category, ['Sample Channel 1', 'Sample Channel 2', 'Sample Channel 3', 'Sample Channel 4', 'Sample Channel 5', 'Sample Channel 6', 'Sample Channel 7', 'Sample Channel 8'])
+    def _build_channels(self, extracted: Dict[str, Any], category: str, content_type: str, page: int) -> List[ChannelResult]:
+        """Tag extracted items with category and content type"""
+        channels = [
+            ChannelResult(**item, category=category, content_type=content_type)
+            for item in extracted['items']
+        ]
         
-        base_subscribers = [50000, 75000, 100000, 150000, 200000, 300000, 500000, 1000000]
+        # If we didn't get enough real data, supplement with mock data
+        if len(channels) < 3:
+            self.logger.warning(f"⚠️ Only found {len(channels)} real channels, supplementing with mock data")
+            mock_channels = self._generate_mock_data(category, page, content_type)
+            channels.extend(mock_channels[:max(0, 8 - len(channels))])
+        return channels
         
-        for i in range(8):  # 8 channels per page
-            name_index = ((page - 1) * 8 + i) % len(names_list)
-            subscriber_base = base_subscribers[i] + (page - 1) * 10000 + random.randint(-5000, 15000)
-            
-            # Format subscriber count realistically
-            if subscriber_base >= 1000000:
-                formatted_subs = f"{subscriber_base // 1000000:.1f}M"
-            elif subscriber_base >= 1000:
-                formatted_subs = f"{subscriber_base // 1000:.1f}K"
-            else:
-                formatted_subs = str(subscriber_base)
-            
-            mock_channels.append({
-                'name': f"{names_list[name_index]} {page}-{i+1}",
-                'link': f'https://t.me/{names_list[name_index].lower().replace(" ", "_")}_{page}_{i+1}',
-                'subscribers': formatted_subs,
-                'description': f'Quality {category} content and updates. Page {page}, item {i+1}',
-                'category': category,
-                'content_type': content_type
-            })
-            
+    def _generate_mock_data(self, category: str, page: int, content_type: str) -> List[ChannelResult]:
+        """Generate realistic mock data for development/testing"""
+        mock_channels = list(build_mock_channels(category, page, content_type))
         self.logger.info(f"📋 Generated {len(mock_channels)} mock channels for {category} category, page {page}")
         return mock_channels
         
-    async def parse_channels(self, category: str, content_types: List[str], max_pages: int, task_id: str) -> List[Dict[str, Any]]:
+    async def _parse_one(self, category: str, content_type: str, page: int, task_id: str) -> Tuple[List[ChannelResult], Optional[int]]:
+        """Parse one page and report progress"""
+        page_results, detected_total = [], None
+        try:
+            self.logger.info(f"📖 Parsing page {page} for {content_type}")
+            page_results, detected_total = await self.parse_page(category, content_type, page)
+        except Exception as e:
+            self.logger.error(f"❌ Error parsing page {page} for {content_type}: {str(e)}")
+            
+        # Update progress; the per-task lock keeps concurrent writes from going stale
+        async with self._progress_lock:
+            self._results_count += len(page_results)
+            try:
+                await task_store.update(
+                    task_id,
+                    progress=self._results_count,
+                    last_page_sample=[asdict(result) for result in page_results[:3]]
+                )
+            except Exception as e:
+                # A lost progress update must not discard the parsed page
+                self.logger.error(f"❌ Error saving progress for page {page} of {content_type}: {str(e)}")
+                
+        return page_results, detected_total
+        
+    async def parse_channels(self, category: str, content_types: List[str], max_pages: int, task_id: str) -> List[ChannelResult]:
         """Main method to parse channels with progress tracking"""
         all_results = []
-        total_pages_per_type = max_pages
+        if max_pages < 1:
+            return all_results
         
         try:
-            for content_type in content_types:
-                self.logger.info(f"🎯 Starting to parse {content_type} for category: {category}")
-                
-                # Get total pages for this content type
-                total_pages = await self.get_total_pages(category, content_type, max_pages)
-                
-                # Update task with total pages info
-                if task_id in parsing_tasks:
-                    parsing_tasks[task_id].total_pages = total_pages * len(content_types)
-                
-                # Parse each page
-                for page in range(1, total_pages + 1):
-                    try:
-                        self.logger.info(f"📖 Parsing page {page}/{total_pages} for {content_type}")
-                        
-                        # Parse the page
-                        page_results = await self.parse_page(category, content_type, page)
-                        all_results.extend(page_results)
-                        
-                        # Update progress
-                        if task_id in parsing_tasks:
-                            current_progress = len(all_results)
-                            parsing_tasks[task_id].progress = current_progress
-                            parsing_tasks[task_id].results = all_results
-                        
-                        # Random delay between pages to avoid rate limiting
-                        if page < total_pages:
-                            await asyncio.sleep(random.uniform(3, 8))
-                            
-                    except Exception as e:
-                        self.logger.error(f"❌ Error parsing page {page} for {content_type}: {str(e)}")
-                        continue
-                        
-                # Delay between content types
-                if len(content_types) > 1:
-                    await asyncio.sleep(random.uniform(5, 10))
+            self.logger.info(f"🎯 Starting to parse {', '.join(content_types)} for category: {category}")
+            
+            # First pages also carry the pagination, so no separate probe navigation is needed
+            first_pages = await asyncio.gather(*(
+                self._parse_one(category, content_type, 1, task_id)
+                for content_type in content_types
+            ))
+            
+            buckets = {}
+            page_counts = []
+            for content_type, (page_results, detected_total) in zip(content_types, first_pages):
+                total_pages = min(detected_total or max_pages, max_pages)
+                self.logger.info(f"📊 Total pages to parse for {content_type}: {total_pages}")
+                buckets[(content_type, 1)] = page_results
+                page_counts.append((content_type, total_pages))
+            
+            # Update task with total pages info
+            await task_store.update(task_id, total_pages=sum(total for _, total in page_counts))
+            
+            # Fan remaining pages out over the browser pool; its context limit bounds concurrency
+            jobs = [(content_type, page) for content_type, total in page_counts for page in range(2, total + 1)]
+            tasks = [
+                asyncio.create_task(self._parse_one(category, content_type, page, task_id))
+                for content_type, page in jobs
+            ]
+            for job, (page_results, _) in zip(jobs, await asyncio.gather(*tasks)):
+                buckets[job] = page_results
+            
+            # One bucket per page keeps page order; flatten once at the end
+            all_results = list(itertools.chain.from_iterable(
+                buckets[(content_type, page)]
+                for content_type, total in page_counts
+                for page in range(1, total + 1)
+            ))
                     
         except Exception as e:
             self.logger.error(f"❌ Error in main parsing method: {str(e)}")
-            if task_id in parsing_tasks:
-                parsing_tasks[task_id].error_message = str(e)
+            await task_store.update(task_id, error_message=str(e))
                 
         return all_results
 
-# Initialize parser
-parser = TGStatParser()
+# Initialize browser pool
+browser_pool = BrowserPool(max_contexts=BROWSER_MAX_CONTEXTS)
+
+# Per-channel documents as returned by /parsing-results
+CHANNEL_PROJECTION = {"_id": 0, "task_id": 0, "position": 0, "created_at": 0}
+
+async def store_channel_results(task_id: str, results: List[ChannelResult], created_at: datetime):
+    """Store one document per channel using batched insert_many
+
+    Documents carry the task's created_at so they expire together with the task.
+    """
+    if not results:
+        return
+    
+    collection = db.parsing_channels
+    if FAST_INSERT and len(results) > FAST_INSERT_MIN_RESULTS:
+        # Fire-and-forget writes: fastest path, but insert errors are not reported and
+        # the last batches may still be in flight when the task reports completion
+        collection = db.get_collection("parsing_channels", write_concern=WriteConcern(w=0))
+    
+    docs = [
+        {**asdict(result), "task_id": task_id, "position": i, "created_at": created_at}
+        for i, result in enumerate(results)
+    ]
+    for start in range(0, len(docs), INSERT_BATCH_SIZE):
+        await collection.insert_many(docs[start:start + INSERT_BATCH_SIZE], ordered=False)
 
 # Background task for parsing
 async def run_parsing_task(task: ParsingTask):
     """Background task to run parsing"""
     try:
         # Update task status
-        parsing_tasks[task.id] = task
-        parsing_tasks[task.id].status = ParsingStatus.running
-        
-        # Initialize parser
-        init_success = await parser.init()
-        if not init_success:
-            parsing_tasks[task.id].status = ParsingStatus.failed
-            parsing_tasks[task.id].error_message = "Failed to initialize parser"
-            return
-            
-        # Run parsing
+        await task_store.update(task.id, status=ParsingStatus.running)
+        
+        # Run parsing on the shared browser pool
+        parser = TGStatParser(browser_pool, use_cache=task.use_cache)
         results = await parser.parse_channels(
             task.category, 
             task.content_types, 
@@ -491,31 +758,31 @@ async def run_parsing_task(task: ParsingTask):
             task.id
         )
         
-        # Update final results
-        parsing_tasks[task.id].results = results
-        parsing_tasks[task.id].status = ParsingStatus.completed
-        parsing_tasks[task.id].completed_at = datetime.utcnow()
-        parsing_tasks[task.id].progress = len(results)
+        # Store the channels before the task reports completion so result reads see them
+        await store_channel_results(task.id, results, task.created_at)
         
-        # Store results in database
+        completed_at = datetime.utcnow()
+        await task_store.update(
+            task.id,
+            status=ParsingStatus.completed,
+            completed_at=completed_at,
+            progress=len(results)
+        )
+        
+        # Store task summary (acknowledged)
         await db.parsing_results.insert_one({
             "task_id": task.id,
             "category": task.category,
             "content_types": task.content_types,
             "max_pages": task.max_pages,
-            "results": results,
+            "results_count": len(results),
             "created_at": task.created_at,
-            "completed_at": task.completed_at
+            "completed_at": completed_at
         })
         
     except Exception as e:
         logging.error(f"❌ Parsing task failed: {str(e)}")
-        if task.id in parsing_tasks:
-            parsing_tasks[task.id].status = ParsingStatus.failed
-            parsing_tasks[task.id].error_message = str(e)
-    finally:
-        # Close parser
-        await parser.close()
+        await task_store.update(task.id, status=ParsingStatus.failed, error_message=str(e))
 
 # API Routes
 @api_router.get("/")
@@ -531,19 +798,23 @@ async def create_status_check(input: StatusCheckCreate):
 
 @api_router.get("/status", response_model=List[StatusCheck])
 async def get_status_checks():
-    status_checks = await db.status_checks.find().to_list(1000)
-    return [StatusCheck(**status_check) for status_check in status_checks]
+    status_checks = await db.status_checks.find({}, {"_id": 0}).to_list(1000)
+    # Stored documents were validated on insert; returning a Response directly skips
+    # response_model validation, which is kept only for the OpenAPI schema
+    return ORJSONResponse(status_checks)
 
 @api_router.post("/start-parsing")
-async def start_parsing(request: ParsingRequest, background_tasks: BackgroundTasks):
-    """Start a new parsing task"""
+async def start_parsing(request: ParsingRequest, background_tasks: BackgroundTasks, cache_control: Optional[str] = None):
+    """Start a new parsing task (pass cache_control=no-cache to force a fresh scrape)"""
     try:
         # Create parsing task
         task = ParsingTask(
             category=request.category,
             content_types=request.content_types,
-            max_pages=request.max_pages
+            max_pages=request.max_pages,
+            use_cache=cache_control != "no-cache"
         )
+        await task_store.create(task)
         
         # Add to background tasks
         background_tasks.add_task(run_parsing_task, task)
@@ -558,70 +829,115 @@ async def start_parsing(request: ParsingRequest, background_tasks: BackgroundTas
         logging.error(f"❌ Error starting parsing task: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@api_router.get("/parsing-status/{task_id}")
-async def get_parsing_status(task_id: str):
-    """Get status of a parsing task"""
-    if task_id not in parsing_tasks:
-        raise HTTPException(status_code=404, detail="Task not found")
-    
-    task = parsing_tasks[task_id]
+def task_status_payload(task: ParsingTask) -> Dict[str, Any]:
+    """Status fields shared by /parsing-status and /parsing-stream"""
     return {
-        "task_id": task_id,
+        "task_id": task.id,
         "status": task.status,
         "progress": task.progress,
         "total_pages": task.total_pages,
-        "results_count": len(task.results),
+        "results_count": task.progress,
+        "last_page_sample": task.last_page_sample,
         "error_message": task.error_message,
         "created_at": task.created_at,
         "completed_at": task.completed_at
     }
 
+@api_router.get("/parsing-status/{task_id}")
+async def get_parsing_status(task_id: str):
+    """Get status of a parsing task"""
+    task = await task_store.get(task_id, validate=False)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    
+    return task_status_payload(task)
+
+@api_router.get("/parsing-stream/{task_id}")
+async def stream_parsing_status(task_id: str):
+    """Stream status updates of a parsing task as server-sent events until it finishes"""
+    task = await task_store.get(task_id, validate=False)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    
+    async def status_events():
+        current, last_event = task, None
+        while current is not None:
+            event = orjson.dumps(task_status_payload(current))
+            # Only push an event when something changed; otherwise a comment keeps
+            # the connection live so clients can enforce their own deadlines
+            if event != last_event:
+                yield b"data: " + event + b"\n\n"
+                last_event = event
+            else:
+                yield b": keepalive\n\n"
+            if current.status in (ParsingStatus.completed, ParsingStatus.failed):
+                break
+            await asyncio.sleep(STATUS_STREAM_INTERVAL)
+            current = await task_store.get(task_id, validate=False)
+    
+    return StreamingResponse(
+        status_events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @api_router.get("/parsing-results/{task_id}")
-async def get_parsing_results(task_id: str):
-    """Get results of a parsing task"""
-    if task_id not in parsing_tasks:
+async def get_parsing_results(
+    task_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(MAX_RESULTS_PAGE, ge=1, le=MAX_RESULTS_PAGE)
+):
+    """Get a page of results of a parsing task"""
+    task = await task_store.get(task_id, validate=False)
+    if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    task = parsing_tasks[task_id]
     if task.status != ParsingStatus.completed:
         raise HTTPException(status_code=400, detail="Task not completed yet")
     
+    # Served by the (task_id, position) index
+    results = await db.parsing_channels.find(
+        {"task_id": task_id}, CHANNEL_PROJECTION
+    ).sort("position", 1).skip(offset).limit(limit).to_list(limit)
+    
     return {
         "task_id": task_id,
         "status": task.status,
         "category": task.category,
         "content_types": task.content_types,
-        "results": task.results,
-        "total_results": len(task.results)
+        "results": results,
+        "offset": offset,
+        "limit": limit,
+        "total_results": task.progress
     }
 
 @api_router.get("/export-results/{task_id}")
 async def export_results(task_id: str):
     """Export results in the specified format"""
-    if task_id not in parsing_tasks:
+    task = await task_store.get(task_id, validate=False)
+    if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    task = parsing_tasks[task_id]
     if task.status != ParsingStatus.completed:
         raise HTTPException(status_code=400, detail="Task not completed yet")
     
     # Format: "1. название \ ссылка \ кол-во подписчиков"
-    export_lines = []
-    for i, result in enumerate(task.results, 1):
-        line = f"{i}. {result['name']} \\ {result['link']} \\ {result['subscribers']}"
-        export_lines.append(line)
-    
-    # Create export file
-    export_content = "\n".join(export_lines)
-    export_file = f"/tmp/tgstat_export_{task_id}.txt"
+    async def export_lines():
+        cursor = db.parsing_channels.find(
+            {"task_id": task_id}, {"_id": 0, "name": 1, "link": 1, "subscribers": 1}
+        ).sort("position", 1)
+        i = 0
+        async for result in cursor:
+            i += 1
+            separator = "\n" if i > 1 else ""
+            yield f"{separator}{i}. {result['name']} \\ {result['link']} \\ {result['subscribers']}".encode("utf-8")
     
-    with open(export_file, 'w', encoding='utf-8') as f:
-        f.write(export_content)
-    
-    return FileResponse(
-        export_file, 
-        filename=f"tgstat_results_{task.category}_{task_id}.txt",
-        media_type="text/plain"
+    # Stream lines as they are formatted instead of staging a file in /tmp
+    filename = quote(f"tgstat_results_{task.category}_{task_id}.txt")
+    return StreamingResponse(
+        export_lines(),
+        media_type="text/plain; charset=utf-8",
+        headers={"Content-Disposition": f"attachment; filename*=utf-8''{filename}"}
     )
 
 # Include the router in the main app
@@ -642,9 +958,15 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def init_db_indexes():
+    await task_store.init()
+    await db.parsing_channels.create_index([("task_id", 1), ("position", 1)])
+    await db.parsing_channels.create_index("created_at", expireAfterSeconds=TASK_TTL_SECONDS)
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
-    # Close parser if still running
-    if parser:
-        await parser.close()
\ No newline at end of file
+    # Close the shared browser
+    await browser_pool.close()
+    POSTPROCESS_EXECUTOR.shutdown(wait=False, cancel_futures=True)
\ No newline at end of file
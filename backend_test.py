@@ -5,77 +5,159 @@ Tests all API endpoints for the TGStat parser application
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import sys
+import functools
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import time
-import json
+import random
+import orjson
 from datetime import datetime
 
+REQUIRED_FIELDS = frozenset(('name', 'link', 'subscribers'))
+TME_LINK_MARKER = 't.me'
+# Anchored on the serialized link field (orjson writes no spaces) so t.me URLs
+# inside descriptions are not counted
+TME_LINK_BYTES = b'"link":"https://t.me/'
+# Seconds of silence after which the status stream is treated as dead
+STREAM_READ_TIMEOUT = 10
+
+def _safe_test(name):
+    """Log any exception escaping a test method as a failure of `name`"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            try:
+                return fn(self, *args, **kwargs)
+            except Exception as e:
+                return self.log_test(name, False, f"Error: {str(e)}")
+        return wrapper
+    return decorator
+
 class TGStatAPITester:
-    def __init__(self, base_url="https://9912f129-f255-4c9a-a4b8-c108c33ed2fc.preview.emergentagent.com"):
+    def __init__(self, base_url="https://9912f129-f255-4c9a-a4b8-c108c33ed2fc.preview.emergentagent.com", verbose=False):
         self.base_url = base_url
+        self.verbose = verbose
         self.api_url = f"{base_url}/api"
+        self._start_url = f"{self.api_url}/start-parsing"
+        self._status_tmpl = f"{self.api_url}/parsing-status/%s"
+        self._stream_tmpl = f"{self.api_url}/parsing-stream/%s"
+        self._results_tmpl = f"{self.api_url}/parsing-results/%s"
+        self._export_tmpl = f"{self.api_url}/export-results/%s"
         self.tests_run = 0
         self.tests_passed = 0
         self.current_task_id = None
+        
+        # One keep-alive session so every call reuses pooled TCP/TLS connections
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=10,
+            pool_maxsize=20,
+            max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[502, 503, 504])
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Accept": "application/json", "Connection": "keep-alive"})
+        
+        # Pay DNS + TCP + TLS once up front so the first test measures a warm connection;
+        # the outcome doubles as the suite's healthcheck
+        self._warmup_error = None
+        try:
+            self.session.head(self.base_url, timeout=5).raise_for_status()
+        except requests.RequestException as e:
+            self._warmup_error = e
+            print(f"⚠️ Connection warm-up failed: {str(e)}")
+
+    def close(self):
+        """Release pooled connections"""
+        self.session.close()
 
-    def log_test(self, name, success, details=""):
-        """Log test results"""
+    def _json(self, r):
+        """Decode a response body once with orjson"""
+        return orjson.loads(r.content) if r.content else {}
+
+    def _post_json(self, url, payload, timeout=15):
+        """POST a payload pre-encoded with orjson"""
+        return self.session.post(
+            url,
+            data=orjson.dumps(payload),
+            headers={"Content-Type": "application/json"},
+            timeout=timeout
+        )
+
+    def _error_details(self, response):
+        """Summarize an error body, decoding it according to its content type"""
+        content_type = response.headers.get("content-type", "")
+        if "json" in content_type:
+            try:
+                data = self._json(response)
+            except orjson.JSONDecodeError:
+                data = None
+            # Mislabelled bodies (proxy error pages, truncated JSON) fall through to raw bytes
+            if isinstance(data, dict):
+                return f", Error: {data.get('detail', 'Unknown error')}"
+        return f", Response: {response.content[:100].decode('utf-8', 'replace')}"
+
+    def log_test(self, name, success, details="", extra_fn=None):
+        """Log test results
+        
+        `extra_fn` is an optional zero-argument callable whose text is appended to
+        `details`. It is only evaluated when details are printed (failures, or verbose
+        mode), and an error inside it is reported instead of raised, so the test is
+        still counted exactly once.
+        """
+        if extra_fn is not None and (self.verbose or not success):
+            try:
+                details += extra_fn()
+            except Exception as e:
+                details += f", Details error: {str(e)}"
+                
         self.tests_run += 1
         if success:
             self.tests_passed += 1
-            print(f"✅ {name} - PASSED {details}")
+            print(f"✅ {name} - PASSED {details}" if self.verbose else f"✅ {name} - PASSED")
         else:
             print(f"❌ {name} - FAILED {details}")
         return success
 
+    @_safe_test("API Root Endpoint")
     def test_api_root(self):
         """Test API root endpoint"""
-        try:
-            response = requests.get(f"{self.api_url}/", timeout=10)
-            success = response.status_code == 200
-            details = f"Status: {response.status_code}"
-            if success:
-                data = response.json()
-                details += f", Message: {data.get('message', 'N/A')}"
-            return self.log_test("API Root Endpoint", success, details)
-        except Exception as e:
-            return self.log_test("API Root Endpoint", False, f"Error: {str(e)}")
+        response = self.session.get(f"{self.api_url}/", timeout=10)
+        success = response.status_code == 200
+        
+        def message():
+            return f", Message: {self._json(response).get('message', 'N/A')}"
+            
+        return self.log_test("API Root Endpoint", success, f"Status: {response.status_code}", message if success else None)
 
+    @_safe_test("Start Parsing")
     def test_start_parsing(self, category="crypto", content_types=["channels"], max_pages=2):
         """Test start parsing endpoint"""
-        try:
-            payload = {
-                "category": category,
-                "content_types": content_types,
-                "max_pages": max_pages
-            }
-            
-            response = requests.post(
-                f"{self.api_url}/start-parsing", 
-                json=payload,
-                timeout=15
-            )
-            
-            success = response.status_code == 200
-            details = f"Status: {response.status_code}"
-            
-            if success:
-                data = response.json()
-                self.current_task_id = data.get('task_id')
-                details += f", Task ID: {self.current_task_id[:8] if self.current_task_id else 'None'}"
-                details += f", Status: {data.get('status', 'N/A')}"
-            else:
-                try:
-                    error_data = response.json()
-                    details += f", Error: {error_data.get('detail', 'Unknown error')}"
-                except:
-                    details += f", Response: {response.text[:100]}"
-                    
-            return self.log_test("Start Parsing", success, details)
+        payload = {
+            "category": category,
+            "content_types": content_types,
+            "max_pages": max_pages
+        }
+        
+        response = self._post_json(self._start_url, payload)
+        
+        success = response.status_code == 200
+        
+        if success:
+            data = self._json(response)
+            self.current_task_id = data.get('task_id')
             
-        except Exception as e:
-            return self.log_test("Start Parsing", False, f"Error: {str(e)}")
+            def extra():
+                task_id = self.current_task_id
+                return f", Task ID: {task_id[:8] if task_id else 'None'}, Status: {data.get('status', 'N/A')}"
+        else:
+            extra = functools.partial(self._error_details, response)
+                
+        return self.log_test("Start Parsing", success, f"Status: {response.status_code}", extra)
 
+    @_safe_test("Parsing Status")
     def test_parsing_status(self, task_id=None):
         """Test parsing status endpoint"""
         if not task_id:
@@ -84,30 +166,40 @@ class TGStatAPITester:
         if not task_id:
             return self.log_test("Parsing Status", False, "No task ID available")
             
-        try:
-            response = requests.get(f"{self.api_url}/parsing-status/{task_id}", timeout=10)
-            success = response.status_code == 200
-            details = f"Status: {response.status_code}"
+        response = self.session.get(self._status_tmpl % task_id, timeout=10)
+        success = response.status_code == 200
+        
+        if success:
+            data = self._json(response)
             
-            if success:
-                data = response.json()
-                details += f", Task Status: {data.get('status', 'N/A')}"
-                details += f", Progress: {data.get('progress', 0)}"
-                details += f", Results Count: {data.get('results_count', 0)}"
-                
-                # Store status for later use
-                self.last_status = data
-            else:
-                try:
-                    error_data = response.json()
-                    details += f", Error: {error_data.get('detail', 'Unknown error')}"
-                except:
-                    details += f", Response: {response.text[:100]}"
-                    
-            return self.log_test("Parsing Status", success, details)
+            def extra():
+                return (
+                    f", Task Status: {data.get('status', 'N/A')}"
+                    f", Progress: {data.get('progress', 0)}"
+                    f", Results Count: {data.get('results_count', 0)}"
+                )
             
-        except Exception as e:
-            return self.log_test("Parsing Status", False, f"Error: {str(e)}")
+            # Store status for later use
+            self.last_status = data
+        else:
+            extra = functools.partial(self._error_details, response)
+                
+        return self.log_test("Parsing Status", success, f"Status: {response.status_code}", extra)
+
+    def _report_status(self, data):
+        """Print a status update; True/False once the task finished, None while it runs"""
+        status = data.get('status', 'unknown')
+        print(f"   Status: {status}, Progress: {data.get('progress', 0)}")
+        
+        if status == "completed":
+            self.last_status = data
+            print("✅ Task completed successfully!")
+            return True
+        elif status == "failed":
+            error_msg = data.get('error_message', 'Unknown error')
+            print(f"❌ Task failed: {error_msg}")
+            return False
+        return None
 
     def wait_for_completion(self, task_id=None, max_wait=60):
         """Wait for parsing task to complete"""
@@ -120,34 +212,75 @@ class TGStatAPITester:
             
         print(f"⏳ Waiting for task {task_id[:8]} to complete (max {max_wait}s)...")
         
+        start_time = time.time()
+        finished = self._stream_until_done(task_id, max_wait)
+        if finished is not None:
+            return finished
+        
+        remaining = max_wait - (time.time() - start_time)
+        if remaining <= 0:
+            print(f"⏰ Timeout waiting for task completion after {max_wait}s")
+            return False
+        return self._poll_until_done(task_id, remaining)
+
+    def _stream_until_done(self, task_id, max_wait):
+        """Follow /parsing-stream over one connection; None if the server can't stream"""
+        start_time = time.time()
+        # The server sends a keepalive every second, so a long silence means a dead stream
+        read_timeout = min(max_wait, STREAM_READ_TIMEOUT)
+        try:
+            with self.session.get(self._stream_tmpl % task_id, stream=True, timeout=(min(10, max_wait), read_timeout)) as response:
+                if response.status_code != 200:
+                    return None
+                    
+                for line in response.iter_lines():
+                    if line.startswith(b"data:"):
+                        finished = self._report_status(orjson.loads(line[5:]))
+                        if finished is not None:
+                            return finished
+                    if time.time() - start_time >= max_wait:
+                        print(f"⏰ Timeout waiting for task completion after {max_wait}s")
+                        return False
+                        
+        except Exception as e:
+            print(f"   Status stream unavailable: {str(e)}")
+        return None
+
+    def _poll_until_done(self, task_id, max_wait):
+        """Poll /parsing-status until the task finishes or max_wait runs out"""
+        # Jittered exponential backoff between polls; reset whenever progress moves
+        base_delay, max_delay = 0.5, 8.0
+        attempt = 0
+        last_progress = -1
+        
+        status_url = self._status_tmpl % task_id
         start_time = time.time()
         while time.time() - start_time < max_wait:
             try:
-                response = requests.get(f"{self.api_url}/parsing-status/{task_id}", timeout=10)
+                response = self.session.get(status_url, timeout=10)
                 if response.status_code == 200:
-                    data = response.json()
-                    status = data.get('status', 'unknown')
-                    progress = data.get('progress', 0)
-                    
-                    print(f"   Status: {status}, Progress: {progress}")
-                    
-                    if status == "completed":
-                        print("✅ Task completed successfully!")
-                        return True
-                    elif status == "failed":
-                        error_msg = data.get('error_message', 'Unknown error')
-                        print(f"❌ Task failed: {error_msg}")
-                        return False
+                    data = self._json(response)
+                    finished = self._report_status(data)
+                    if finished is not None:
+                        return finished
                         
-                time.sleep(3)  # Wait 3 seconds between checks
+                    progress = data.get('progress', 0)
+                    if progress > last_progress:
+                        last_progress = progress
+                        attempt = 0
                 
             except Exception as e:
                 print(f"   Error checking status: {str(e)}")
-                time.sleep(3)
+            
+            delay = min(max_delay, base_delay * 2 ** attempt) * random.uniform(0.5, 1.5)
+            remaining = max_wait - (time.time() - start_time)
+            time.sleep(max(0, min(delay, remaining)))
+            attempt += 1
                 
         print(f"⏰ Timeout waiting for task completion after {max_wait}s")
         return False
 
+    @_safe_test("Parsing Results")
     def test_parsing_results(self, task_id=None):
         """Test parsing results endpoint"""
         if not task_id:
@@ -156,42 +289,54 @@ class TGStatAPITester:
         if not task_id:
             return self.log_test("Parsing Results", False, "No task ID available")
             
-        try:
-            response = requests.get(f"{self.api_url}/parsing-results/{task_id}", timeout=10)
-            success = response.status_code == 200
-            details = f"Status: {response.status_code}"
+        # The completion poll may already carry the results; skip the extra GET then
+        last_status = getattr(self, 'last_status', None)
+        if last_status and last_status.get("status") == "completed" and "results" in last_status:
+            self.last_results = last_status
+            return self.log_test(
+                "Parsing Results", True, "Source: completed status",
+                functools.partial(self._describe_results, last_status)
+            )
             
-            if success:
-                data = response.json()
-                results = data.get('results', [])
-                details += f", Results Count: {len(results)}"
-                details += f", Category: {data.get('category', 'N/A')}"
-                details += f", Content Types: {data.get('content_types', [])}"
+        response = self.session.get(self._results_tmpl % task_id, timeout=10)
+        success = response.status_code == 200
+        
+        if success:
+            data = self._json(response)
+            extra = functools.partial(self._describe_results, data, response.content)
+            self.last_results = data
+        else:
+            extra = functools.partial(self._error_details, response)
                 
-                # Validate result format
-                if results:
-                    first_result = results[0]
-                    required_fields = ['name', 'link', 'subscribers']
-                    has_required = all(field in first_result for field in required_fields)
-                    details += f", Has Required Fields: {has_required}"
-                    
-                    # Check if links are realistic
-                    valid_links = sum(1 for r in results if 't.me' in r.get('link', ''))
-                    details += f", Valid t.me Links: {valid_links}/{len(results)}"
-                    
-                self.last_results = data
+        return self.log_test("Parsing Results", success, f"Status: {response.status_code}", extra)
+
+    def _describe_results(self, data, raw=None):
+        """Validate a results payload and summarize it for the test log
+        
+        When the raw response body is available, t.me links are counted straight
+        from the bytes instead of walking every decoded result.
+        """
+        results = data.get('results', [])
+        details = f", Results Count: {len(results)}"
+        details += f", Category: {data.get('category', 'N/A')}"
+        details += f", Content Types: {data.get('content_types', [])}"
+        
+        # Validate result format on the first entry only
+        if results:
+            has_required = REQUIRED_FIELDS.issubset(results[0])
+            details += f", Has Required Fields: {has_required}"
+            
+            # Check if links are realistic
+            if raw is not None:
+                valid_links = raw.count(TME_LINK_BYTES)
             else:
-                try:
-                    error_data = response.json()
-                    details += f", Error: {error_data.get('detail', 'Unknown error')}"
-                except:
-                    details += f", Response: {response.text[:100]}"
-                    
-            return self.log_test("Parsing Results", success, details)
+                marker = TME_LINK_MARKER
+                valid_links = sum(1 for r in results if marker in r.get('link', ''))
+            details += f", Valid t.me Links: {valid_links}/{len(results)}"
             
-        except Exception as e:
-            return self.log_test("Parsing Results", False, f"Error: {str(e)}")
+        return details
 
+    @_safe_test("Export Results")
     def test_export_results(self, task_id=None):
         """Test export results endpoint"""
         if not task_id:
@@ -200,71 +345,76 @@ class TGStatAPITester:
         if not task_id:
             return self.log_test("Export Results", False, "No task ID available")
             
-        try:
-            response = requests.get(f"{self.api_url}/export-results/{task_id}", timeout=10)
+        # Stream the body so large exports are validated line by line
+        with self.session.get(self._export_tmpl % task_id, timeout=10, stream=True) as response:
             success = response.status_code == 200
             details = f"Status: {response.status_code}"
             
             if success:
                 content_type = response.headers.get('content-type', '')
-                content_length = len(response.content)
+                content_length = response.headers.get('content-length')
                 details += f", Content-Type: {content_type}"
-                details += f", Size: {content_length} bytes"
+                details += f", Size: {content_length} bytes" if content_length else ", Size: chunked"
                 
                 # Check if it's a text file
                 if 'text' in content_type:
-                    content = response.text
-                    lines = content.split('\n')
-                    details += f", Lines: {len(lines)}"
+                    response.encoding = response.encoding or 'utf-8'
+                    lines = response.iter_lines(decode_unicode=True)
+                    first_line = next(lines, "").strip()
+                    line_count = 1 + sum(1 for _ in lines)
+                    details += f", Lines: {line_count}"
                     
                     # Validate export format: "1. название \ ссылка \ количество подписчиков"
-                    if lines:
-                        first_line = lines[0].strip()
-                        has_correct_format = '\\' in first_line and first_line.startswith('1.')
-                        details += f", Correct Format: {has_correct_format}"
-                        
-                        if has_correct_format:
-                            parts = first_line.split('\\')
-                            details += f", Parts: {len(parts)}"
+                    has_correct_format = '\\' in first_line and first_line.startswith('1.')
+                    details += f", Correct Format: {has_correct_format}"
+                    
+                    if has_correct_format:
+                        parts = first_line.split('\\')
+                        details += f", Parts: {len(parts)}"
                             
             else:
-                try:
-                    error_data = response.json()
-                    details += f", Error: {error_data.get('detail', 'Unknown error')}"
-                except:
-                    details += f", Response: {response.text[:100]}"
-                    
-            return self.log_test("Export Results", success, details)
-            
-        except Exception as e:
-            return self.log_test("Export Results", False, f"Error: {str(e)}")
+                details += self._error_details(response)
+                
+        return self.log_test("Export Results", success, details)
 
     def test_invalid_endpoints(self):
         """Test invalid endpoints return proper errors"""
         tests = [
-            ("Invalid Task ID Status", f"{self.api_url}/parsing-status/invalid-id", 404),
-            ("Invalid Task ID Results", f"{self.api_url}/parsing-results/invalid-id", 404),
-            ("Invalid Task ID Export", f"{self.api_url}/export-results/invalid-id", 404),
+            ("Invalid Task ID Status", self._status_tmpl % "invalid-id", 404),
+            ("Invalid Task ID Results", self._results_tmpl % "invalid-id", 404),
+            ("Invalid Task ID Export", self._export_tmpl % "invalid-id", 404),
         ]
         
+        # The lookups are independent, so overlap them on the session's connection pool
         all_passed = True
-        for test_name, url, expected_status in tests:
-            try:
-                response = requests.get(url, timeout=10)
-                success = response.status_code == expected_status
-                details = f"Expected: {expected_status}, Got: {response.status_code}"
-                
-                if not self.log_test(test_name, success, details):
-                    all_passed = False
+        with ThreadPoolExecutor(max_workers=len(tests)) as executor:
+            futures = [
+                (test_name, expected_status, executor.submit(self.session.get, url, timeout=10))
+                for test_name, url, expected_status in tests
+            ]
+            
+            for test_name, expected_status, future in futures:
+                try:
+                    response = future.result()
+                    success = response.status_code == expected_status
+                    details = f"Expected: {expected_status}, Got: {response.status_code}"
                     
-            except Exception as e:
-                self.log_test(test_name, False, f"Error: {str(e)}")
-                all_passed = False
+                    if not self.log_test(test_name, success, details):
+                        all_passed = False
+                        
+                except Exception as e:
+                    self.log_test(test_name, False, f"Error: {str(e)}")
+                    all_passed = False
                 
         return all_passed
 
     def test_parsing_with_different_params(self):
-        """Test parsing with different parameters"""
+        """Test parsing with different parameters
+        
+        The POSTs are overlapped on the shared session's connection pool. Once the
+        server grows a POST /start-parsing/batch endpoint (body {"jobs": [...]},
+        response {"task_ids": [...]}) this should collapse into a single request.
+        """
         test_cases = [
             ("Crypto Channels", {"category": "crypto", "content_types": ["channels"], "max_pages": 1}),
             ("Tech Chats", {"category": "tech", "content_types": ["chats"], "max_pages": 1}),
@@ -272,23 +422,29 @@ class TGStatAPITester:
         ]
         
         all_passed = True
-        for test_name, params in test_cases:
-            try:
-                response = requests.post(f"{self.api_url}/start-parsing", json=params, timeout=15)
-                success = response.status_code == 200
-                details = f"Status: {response.status_code}, Params: {params}"
-                
-                if success:
-                    data = response.json()
-                    task_id = data.get('task_id')
-                    details += f", Task ID: {task_id[:8] if task_id else 'None'}"
-                
-                if not self.log_test(f"Start Parsing - {test_name}", success, details):
-                    all_passed = False
+        with ThreadPoolExecutor(max_workers=len(test_cases)) as executor:
+            futures = {
+                executor.submit(self._post_json, self._start_url, params): (test_name, params)
+                for test_name, params in test_cases
+            }
+            
+            for future in as_completed(futures):
+                test_name, params = futures[future]
+                try:
+                    response = future.result()
+                    success = response.status_code == 200
                     
-            except Exception as e:
-                self.log_test(f"Start Parsing - {test_name}", False, f"Error: {str(e)}")
-                all_passed = False
+                    def task_id_details():
+                        task_id = self._json(response).get('task_id')
+                        return f", Task ID: {task_id[:8] if task_id else 'None'}"
+                    
+                    details = f"Status: {response.status_code}, Params: {params}"
+                    if not self.log_test(f"Start Parsing - {test_name}", success, details, task_id_details if success else None):
+                        all_passed = False
+                        
+                except Exception as e:
+                    self.log_test(f"Start Parsing - {test_name}", False, f"Error: {str(e)}")
+                    all_passed = False
                 
         return all_passed
 
@@ -297,6 +453,12 @@ class TGStatAPITester:
         print("🚀 Starting TGStat Parser API Comprehensive Testing")
         print("=" * 60)
         
+        # Bail out early instead of letting every test time out against a dead host
+        if self._warmup_error is not None:
+            print(f"❌ Host unreachable: {str(self._warmup_error)}")
+            self.close()
+            return 2
+        
         # Basic API tests
         print("\n📋 Basic API Tests:")
         self.test_api_root()
@@ -326,6 +488,8 @@ class TGStatAPITester:
         print("\n🔧 Parameter Variation Tests:")
         self.test_parsing_with_different_params()
         
+        self.close()
+        
         # Final results
         print("\n" + "=" * 60)
         print(f"📊 Test Results: {self.tests_passed}/{self.tests_run} tests passed")
@@ -339,7 +503,7 @@ class TGStatAPITester:
 
 def main():
     """Main test execution"""
-    tester = TGStatAPITester()
+    tester = TGStatAPITester(verbose="-v" in sys.argv[1:])
     return tester.run_comprehensive_test()
 
 if __name__ == "__main__":
@@ -0,0 +1,49 @@
+import pytest
+
+from backend.postprocess import parse_subscriber_count, postprocess_channels
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("12.3K", 12_300),
+    ("1,2 млн", 1_200_000),
+    ("1 234 567", 1_234_567),
+    ("2.01M", 2_010_000),
+    ("2.01K", 2_010),
+    ("45 тыс", 45_000),
+    ("987", 987),
+])
+def test_parse_subscriber_count(text, expected):
+    assert parse_subscriber_count(text) == expected
+
+
+def test_parse_subscriber_count_without_digits():
+    assert parse_subscriber_count("N/A") is None
+
+
+def test_parse_subscriber_count_rounds_every_two_decimal_k_value():
+    for hundredths in range(10_000):
+        text = f"{hundredths // 100}.{hundredths % 100:02d}K"
+        assert parse_subscriber_count(text) == hundredths * 10, text
+
+
+def test_postprocess_channels_normalizes_whitespace_and_counts():
+    items = [{
+        "name": "  Crypto \n  News ",
+        "link": " https://t.me/crypto_news\n",
+        "subscribers": " 12.3K\tподписчиков ",
+        "description": "Daily\n\n  updates ",
+    }]
+
+    assert postprocess_channels(items) == [{
+        "name": "Crypto News",
+        "link": "https://t.me/crypto_news",
+        "subscribers": "12.3K подписчиков",
+        "description": "Daily updates",
+        "subscribers_count": 12_300,
+    }]
+
+
+def test_postprocess_channels_keeps_unparsable_counts_as_none():
+    items = [{"name": "Chat", "link": "https://t.me/chat", "subscribers": "N/A", "description": ""}]
+
+    assert postprocess_channels(items)[0]["subscribers_count"] is None